@@ -1,35 +1,356 @@
 """
 Web Crawler and File Downloader
 
-Esta versión recorre (crawl) una URL de partida usando Selenium (modo headless),
-descarga los ficheros cuyas extensiones se indiquen y además sigue los enlaces
+Esta versión recorre (crawl) una URL de partida usando aiohttp + selectolax (o Selenium
+en modo headless cuando se pide ejecutar JavaScript), descarga los ficheros cuyas extensiones se indiquen y además sigue los enlaces
 de las páginas HTML. Si una URL no tiene extensión se asume que es HTML.
 La profundidad de rastreo se calcula en función del número de saltos (nivel 1 es la URL de partida, 2 es una página enlazada, etc.).
 """
 
 import os
 import sys
+import asyncio
+import collections
+import re
 import time
+import sqlite3
+import hashlib
+import functools
+import itertools
 import argparse
 import urllib.parse
+import urllib.robotparser
 import datetime
-import requests
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import WebDriverException, NoSuchElementException, StaleElementReferenceException
-from selenium.webdriver.common.by import By
+import concurrent.futures
+from queue import Queue
+from dataclasses import dataclass, field
+from typing import Optional
+import aiohttp
+import aiofiles
+from selectolax.parser import HTMLParser
 from dotenv import load_dotenv
-from azure.storage.blob import BlobServiceClient
+from azure.core.exceptions import ResourceModifiedError
+from azure.storage.blob import BlobServiceClient, ContentSettings
+from pybloom_live import ScalableBloomFilter
 
-# Variables globales para llevar conteo de archivos descargados y URLs visitadas.
-downloaded_files_count = 0
-visited_pages = set()
+# Tamaño por defecto de los bloques escritos a disco al descargar ficheros (--io_chunksize):
+# lo que llega de la red se acumula hasta este tamaño antes de cada escritura.
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+_SIZE_SUFFIXES = {"": 1, "k": 1024, "m": 1024 * 1024}
+
+# Subidas a Azure Blob Storage: ficheros subidos a la vez, bloques en paralelo
+# por fichero y tamaño de cada bloque.
+UPLOAD_WORKERS = 8
+UPLOAD_MAX_CONCURRENCY = 16
+UPLOAD_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Filtro de Bloom de URLs visitadas: capacidad inicial (crece por capas si se supera)
+# y tasa de falsos positivos, es decir, de páginas nuevas que se darían por visitadas.
+VISITED_INITIAL_CAPACITY = 1_000_000
+VISITED_ERROR_RATE = 1e-4
+
+# Escrituras agrupadas en cada transacción de la base de datos de estado (--state_db).
+STATE_COMMIT_EVERY = 500
+
+# Cabecera User-Agent enviada en todas las peticiones HTTP.
+USER_AGENT = "Mozilla/5.0 (compatible; web_crawler)"
+# Nombre con el que se buscan las reglas en robots.txt. urllib.robotparser solo compara
+# la parte anterior a la primera "/" de USER_AGENT ("Mozilla"), así que se usa el token propio.
+ROBOTS_AGENT = "web_crawler"
+
+# Pool de conexiones de la sesión aiohttp: máximo de conexiones abiertas en total y
+# segundos mínimos que se mantiene viva una conexión ociosa para reutilizarla.
+CONNECTION_LIMIT = 64
+KEEPALIVE_TIMEOUT = 30
+
+# Reintentos de las peticiones HTTP ante errores transitorios: número máximo,
+# espera base (se duplica en cada intento) y códigos de estado que se reintentan.
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Segundos máximos para descargar el robots.txt de un host.
+ROBOTS_TIMEOUT = 5
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+# Parámetros de seguimiento que no cambian el contenido y se ignoran al canonicalizar.
+_TRACKING_PARAMS = frozenset({"fbclid", "gclid"})
+_TRACKING_PREFIX = "utm_"
+# Enlaces que nunca llevan a otra página http(s): anclas dentro de la misma página
+# y esquemas como mailto: o javascript:. Se descartan antes de resolverlos con urljoin.
+_SKIP_HREF_RE = re.compile(r"\s*(?:#|(?:mailto|javascript|tel|data):)", re.IGNORECASE)
+
+# urlsplit es Python puro y el mismo enlace aparece en muchas páginas (menús, pies...),
+# así que se memoriza su resultado.
+_splitcache = functools.lru_cache(maxsize=65536)(urllib.parse.urlsplit)
+
+@dataclass
+class CrawlContext:
+    """
+    Configuración y estado de un rastreo. Se pasa a todas las funciones del rastreo
+    en lugar de usar variables globales, de modo que en un mismo proceso pueden
+    ejecutarse varios rastreos independientes.
+    El estado mutable solo se modifica desde el event loop (un único hilo) y sin
+    ningún await entre la comprobación y la actualización, así que no necesita
+    cerrojos. La excepción es blob_index, compartido con los hilos de subida a Azure:
+    cada hilo solo lee una entrada o asigna una (blob_index[nombre] = ...), y en
+    CPython cada una de esas operaciones sobre un dict es atómica (GIL).
+    """
+    download_dir: str
+    start_domain: str
+    max_depth: int = 2
+    stay_on_domain: bool = True
+    allowed_exts: frozenset = frozenset({"pdf", "html"})
+    max_files: int = 100
+    delay: float = 1
+    exclude_download: frozenset = frozenset()
+    exclude_crawl_re: Optional[re.Pattern] = None
+    per_host: int = 2
+    io_chunksize: int = DOWNLOAD_CHUNK_SIZE
+    obey_robots: bool = True
+    driver_pool: Optional[Queue] = None
+    container_name: Optional[str] = None
+    blob_service_client: Optional[BlobServiceClient] = None
+    # {nombre del blob: instante de última modificación (timestamp)} (ver list_blob_index())
+    blob_index: dict = field(default_factory=dict)
+
+    downloaded_files_count: int = 0
+    # Las URLs visitadas se guardan (canonicalizadas) en un filtro de Bloom escalable:
+    # ocupa unos 20 bits por URL a cambio de un 0,01% de falsos positivos
+    # (en el peor caso se omite alguna página, nunca se descarga dos veces).
+    visited_pages: ScalableBloomFilter = field(
+        default_factory=lambda: ScalableBloomFilter(initial_capacity=VISITED_INITIAL_CAPACITY,
+                                                    error_rate=VISITED_ERROR_RATE))
+    # Base de datos SQLite opcional (--state_db) donde se persisten las URLs visitadas y
+    # la cola pendiente para poder reanudar un rastreo interrumpido.
+    state_db: Optional[sqlite3.Connection] = None
+    state_pending_writes: int = 0
+    # Hash SHA-256 del contenido de cada fichero descargado -> ruta local, para no guardar
+    # (ni subir) dos veces el mismo contenido. Con --state_db se guarda en la base de datos.
+    file_digests: dict = field(default_factory=dict)
+    # Rutas locales que se están descargando en este momento (evita que dos
+    # descargas simultáneas escriban el mismo fichero).
+    downloads_in_progress: set = field(default_factory=set)
+    # Contador para dar nombres únicos a los ficheros cuya URL no tiene nombre.
+    unnamed_files: itertools.count = field(default_factory=itertools.count)
+    # URLs (canonicalizadas) que ya se han enviado a la cola de descargas. Un mismo
+    # fichero suele enlazarse desde muchas páginas (menús, pies...), y así se pide una sola vez.
+    requested_downloads: set = field(default_factory=set)
+    # Instante (time.monotonic) de la última petición a cada host y cerrojo por host
+    # para calcular la espera entre peticiones (ver wait_for_host()).
+    host_last_request: collections.defaultdict = field(default_factory=lambda: collections.defaultdict(float))
+    host_locks: collections.defaultdict = field(default_factory=lambda: collections.defaultdict(asyncio.Lock))
+    # Como mucho per_host peticiones simultáneas contra el mismo host.
+    host_sems: collections.defaultdict = field(init=False)
+    # robots.txt ya analizado de cada host (ver robots_allowed()), cerrojo por host para
+    # descargarlo una sola vez y Crawl-delay de los hosts que piden esperar más que delay.
+    robots: dict = field(default_factory=dict)
+    robots_locks: collections.defaultdict = field(default_factory=lambda: collections.defaultdict(asyncio.Lock))
+    host_delays: dict = field(default_factory=dict)
+
+    # Recursos de la ejecución, asignados por crawl_async().
+    session: Optional[aiohttp.ClientSession] = None
+    queue: Optional[asyncio.PriorityQueue] = None
+    page_sequence: itertools.count = field(default_factory=itertools.count)
+    download_queue: Optional[asyncio.Queue] = None
+    driver_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+    upload_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+    # Subidas en curso; cada futuro se retira del conjunto al terminar.
+    upload_futures: set = field(default_factory=set)
+
+    def __post_init__(self):
+        self.host_sems = collections.defaultdict(lambda: asyncio.Semaphore(self.per_host))
+
+    def max_files_reached(self):
+        return bool(self.max_files) and self.downloaded_files_count >= self.max_files
+
+@functools.lru_cache(maxsize=65536)
+def link_info(url):
+    """
+    Devuelve (host, extensión) de un enlace, analizando la URL una sola vez.
+    El host va en minúsculas y la extensión en minúsculas y sin punto; si no hay
+    extensión (cadena vacía) se asume HTML.
+    Se memoriza porque los mismos enlaces se repiten en muchas páginas.
+    """
+    parts = _splitcache(url)
+    file_ext = os.path.splitext(parts.path)[1].strip(".").lower()
+    return parts.netloc.lower(), file_ext or "html"
+
+@functools.lru_cache(maxsize=4096)
+def canonicalize(url):
+    """
+    Devuelve la forma canónica de una URL para detectar duplicados:
+    esquema y host en minúsculas, sin el puerto por defecto, sin fragmento,
+    sin barra final en la ruta, sin parámetros de seguimiento (utm_*, fbclid, gclid)
+    y con el resto de parámetros de la query ordenados.
+    Lanza ValueError si la URL no se puede analizar (por ejemplo, un IPv6 mal formado).
+    """
+    parts = _splitcache(url)
+    scheme = parts.scheme.lower()
+    try:
+        netloc = (parts.hostname or "").lower()
+        if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+            netloc += f":{parts.port}"
+    except ValueError:
+        # Puerto no válido (por ejemplo, ":99999" o ":80x"): se deja el host tal cual.
+        netloc = parts.netloc.lower()
+    params = [(k, v) for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+              if k not in _TRACKING_PARAMS and not k.startswith(_TRACKING_PREFIX)]
+    query = urllib.parse.urlencode(sorted(params))
+    return urllib.parse.urlunsplit((scheme, netloc, parts.path.rstrip("/") or "/", query, ""))
+
+def parse_size(text):
+    """
+    Convierte un tamaño como "262144", "256k" o "1M" a bytes (para argparse).
+    """
+    match = re.fullmatch(r"(\d+)([kKmM]?)", text.strip())
+    if not match or int(match.group(1)) == 0:
+        raise argparse.ArgumentTypeError(f"tamaño no válido: {text!r} (ejemplos: 65536, 256k, 1M)")
+    return int(match.group(1)) * _SIZE_SUFFIXES[match.group(2).lower()]
+
+def open_state_db(ctx, path):
+    """
+    Abre (o crea) la base de datos SQLite de estado del rastreo en modo WAL.
+    Las escrituras se agrupan en transacciones de STATE_COMMIT_EVERY operaciones
+    para amortizar el coste de cada fsync.
+    """
+    ctx.state_db = sqlite3.connect(path, isolation_level=None)
+    ctx.state_db.execute("PRAGMA journal_mode=WAL")
+    ctx.state_db.execute("PRAGMA synchronous=NORMAL")
+    ctx.state_db.execute("CREATE TABLE IF NOT EXISTS visited (url TEXT PRIMARY KEY)")
+    ctx.state_db.execute("CREATE TABLE IF NOT EXISTS queue (url TEXT PRIMARY KEY, depth INT)")
+    ctx.state_db.execute("CREATE TABLE IF NOT EXISTS downloads (url TEXT PRIMARY KEY, ext TEXT)")
+    ctx.state_db.execute("CREATE TABLE IF NOT EXISTS digests (hash TEXT PRIMARY KEY, path TEXT)")
+    ctx.state_db.execute("BEGIN")
+
+def close_state_db(ctx):
+    """
+    Confirma las escrituras pendientes y cierra la base de datos de estado.
+    """
+    if ctx.state_db is None:
+        return
+    ctx.state_db.execute("COMMIT")
+    ctx.state_db.close()
+    ctx.state_db = None
+
+def _state_write(ctx, sql, params):
+    """
+    Ejecuta una escritura en la base de datos de estado, confirmando la transacción
+    cada STATE_COMMIT_EVERY escrituras.
+    """
+    cursor = ctx.state_db.execute(sql, params)
+    ctx.state_pending_writes += 1
+    if ctx.state_pending_writes >= STATE_COMMIT_EVERY:
+        ctx.state_db.execute("COMMIT")
+        ctx.state_db.execute("BEGIN")
+        ctx.state_pending_writes = 0
+    return cursor
+
+def mark_visited(ctx, canonical_url):
+    """
+    Marca la URL (canonicalizada) como visitada. Devuelve False si ya lo estaba.
+    El filtro de Bloom responde sin tocar disco; si hay base de datos de estado,
+    esta es la que decide (incluye las URLs visitadas en ejecuciones anteriores).
+    """
+    if canonical_url in ctx.visited_pages:
+        return False
+    ctx.visited_pages.add(canonical_url)
+    if ctx.state_db is None:
+        return True
+    return _state_write(ctx, "INSERT OR IGNORE INTO visited (url) VALUES (?)", (canonical_url,)).rowcount == 1
+
+def enqueue_download(ctx, url, file_ext):
+    """
+    Encola un fichero para su descarga, salvo que ya se hubiera pedido antes en este rastreo.
+    Si hay base de datos de estado, la descarga se registra como pendiente hasta que termine.
+    """
+    canonical_url = canonicalize(url)
+    if canonical_url in ctx.requested_downloads:
+        return
+    ctx.requested_downloads.add(canonical_url)
+    ctx.download_queue.put_nowait((url, file_ext))
+    if ctx.state_db is not None:
+        _state_write(ctx, "INSERT OR IGNORE INTO downloads (url, ext) VALUES (?, ?)", (url, file_ext))
+
+def dequeue_download(ctx, url):
+    """
+    Elimina la descarga de la lista de descargas pendientes persistida (si hay base de datos de estado).
+    """
+    if ctx.state_db is not None:
+        _state_write(ctx, "DELETE FROM downloads WHERE url = ?", (url,))
+
+def _put_page(ctx, url, depth):
+    """
+    Mete una página en la frontera de rastreo (una cola con prioridad). Primero salen
+    las páginas del dominio de partida y, dentro de ellas, las menos profundas; a igual
+    prioridad se respeta el orden de llegada.
+    """
+    off_domain = link_info(url)[0] != ctx.start_domain
+    ctx.queue.put_nowait((off_domain, depth, next(ctx.page_sequence), url))
+
+def enqueue_page(ctx, url, depth):
+    """
+    Encola una página para rastrear y, si hay base de datos de estado, la registra como pendiente.
+    """
+    _put_page(ctx, url, depth)
+    if ctx.state_db is not None:
+        _state_write(ctx, "INSERT OR IGNORE INTO queue (url, depth) VALUES (?, ?)", (url, depth))
+
+def dequeue_page(ctx, url):
+    """
+    Elimina la página de la cola pendiente persistida (si hay base de datos de estado).
+    """
+    if ctx.state_db is not None:
+        _state_write(ctx, "DELETE FROM queue WHERE url = ?", (url,))
+
+def pending_pages(ctx):
+    """
+    Devuelve las páginas (url, profundidad) que quedaron pendientes en una ejecución anterior.
+    Una página se marca como visitada al empezar a procesarla pero solo sale de la cola
+    cuando sus enlaces ya están encolados; si la ejecución se interrumpió entre medias,
+    se desmarca como visitada para que vuelva a procesarse.
+    """
+    if ctx.state_db is None:
+        return []
+    pending = ctx.state_db.execute("SELECT url, depth FROM queue").fetchall()
+    for url, _ in pending:
+        _state_write(ctx, "DELETE FROM visited WHERE url = ?", (canonicalize(url),))
+    return pending
+
+def pending_downloads(ctx):
+    """
+    Devuelve las descargas (url, extensión) que quedaron pendientes en una ejecución anterior.
+    """
+    if ctx.state_db is None:
+        return []
+    return ctx.state_db.execute("SELECT url, ext FROM downloads").fetchall()
+
+def register_digest(ctx, digest, local_path):
+    """
+    Registra el hash SHA-256 del contenido de un fichero descargado.
+    Devuelve None si el contenido es nuevo, o la ruta del fichero ya descargado
+    con el mismo contenido (la misma página o PDF publicado bajo otra URL).
+    """
+    if ctx.state_db is None:
+        existing = ctx.file_digests.get(digest)
+        if existing is None:
+            ctx.file_digests[digest] = local_path
+        return existing
+    if _state_write(ctx, "INSERT OR IGNORE INTO digests (hash, path) VALUES (?, ?)", (digest, local_path)).rowcount == 1:
+        return None
+    return ctx.state_db.execute("SELECT path FROM digests WHERE hash = ?", (digest,)).fetchone()[0]
 
 def setup_driver(execute_js: bool):
     """
     Configura el driver de Selenium en modo headless.
-    Aunque no se ejecute JavaScript, se utiliza Selenium.
+    Si execute_js es False se desactiva el JavaScript de las páginas.
+    Selenium se importa aquí y no al cargar el módulo: solo se necesita con --js yes,
+    y así el rastreo sin JavaScript no paga su importación.
     """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.common.exceptions import WebDriverException
+
     chrome_options = Options()
     chrome_options.add_argument("--headless") # modo headless
     chrome_options.add_argument("--disable-gpu")
@@ -37,6 +358,20 @@ def setup_driver(execute_js: bool):
     chrome_options.add_experimental_option("excludeSwitches", ["enable-logging"])
     chrome_options.add_argument("--use-gl=swiftshader")
     chrome_options.add_argument("--enable-unsafe-swiftshader")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-extensions")
+    # Para extraer enlaces basta con el DOM: driver.get() vuelve en DOMContentLoaded
+    # (sin esperar al resto de recursos) y no se cargan imágenes, CSS ni fuentes.
+    chrome_options.page_load_strategy = "eager"
+    chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+    prefs = {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.managed_default_content_settings.stylesheets": 2,
+        "profile.managed_default_content_settings.fonts": 2,
+    }
+    if not execute_js:
+        prefs["profile.managed_default_content_settings.javascript"] = 2
+    chrome_options.add_experimental_option("prefs", prefs)
 
     try:  
         driver = webdriver.Chrome(options=chrome_options)  
@@ -45,41 +380,99 @@ def setup_driver(execute_js: bool):
         sys.exit(1)  
     return driver  
  
-def upload_to_azure_blob(file_path, container_name, blob_service_client, override_if_newer=True):
+def list_blob_index(container_name, blob_service_client):
+    """
+    Devuelve un diccionario {nombre del blob: instante de última modificación} con
+    todos los blobs del contenedor, obtenido con una sola consulta paginada.
+    Los instantes se guardan como timestamps (float) para compararlos directamente
+    con el st_mtime de los ficheros locales.
+    """
+    container_client = blob_service_client.get_container_client(container_name)
+    return {blob.name: blob.last_modified.timestamp() for blob in container_client.list_blobs()}
+
+def upload_to_azure_blob(file_path, container_name, blob_service_client, blob_index, md5=None, override_if_newer=True,
+                         local_stat=None):
     """
     Sube un fichero al contenedor especificado en Azure Blob Storage.
     Verifica la fecha de última modificación y sube el archivo únicamente si es más reciente.
+    La fecha del blob se toma de blob_index (ver list_blob_index()) en lugar de pedir
+    sus propiedades al servicio; si el blob existe, la subida es además condicional
+    (If-Unmodified-Since) por si cambió después de listar el contenedor. Tras subirlo
+    se actualiza blob_index, de modo que el índice sigue siendo válido durante el rastreo.
+    Los bloques de un mismo fichero se suben en paralelo (max_concurrency).
+    Si se indica md5 (el digest calculado durante la descarga) se envía como
+    Content-MD5 del blob, sin volver a leer el fichero para calcularlo.
+    Si se indica local_stat (el os.stat_result obtenido al terminar la descarga) se usan
+    su fecha y tamaño en lugar de volver a consultar el sistema de ficheros.
     """
-    blob_client = blob_service_client.get_blob_client(container=container_name, blob=os.path.basename(file_path))
+    blob_name = os.path.basename(file_path)
+    blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
+    if local_stat is None:
+        local_stat = os.stat(file_path)
 
-    try:  
-        props = blob_client.get_blob_properties()  
-        blob_last_modified = props.last_modified.replace(tzinfo=None)  
-        local_modified = datetime.datetime.fromtimestamp(os.path.getmtime(file_path))  
-        if local_modified <= blob_last_modified:  
-            print(f"Skipping upload for {file_path} since blob is up-to-date.")  
-            return  
-    except Exception:  
-        # El blob no existe o hubo error en la obtención de sus propiedades  
-        pass  
-
-    with open(file_path, "rb") as data:  
-        blob_client.upload_blob(data, overwrite=True)  
-    print(f"\tUploaded {file_path} to container '{container_name}'.")  
-
-def download_file(file_url, file_ext, download_dir, delay, exclude_download, blob_upload, container_name, blob_service_client):
-    """
-    Descarga el fichero desde file_url hacia download_dir.
+    upload_options = {}
+    if md5 is not None:
+        upload_options["content_settings"] = ContentSettings(content_md5=md5)
+    blob_last_modified = blob_index.get(blob_name)
+    if blob_last_modified is not None:
+        if local_stat.st_mtime <= blob_last_modified:
+            print(f"Skipping upload for {file_path} since blob is up-to-date.")
+            return
+        upload_options["if_unmodified_since"] = datetime.datetime.fromtimestamp(local_stat.st_mtime,
+                                                                             tz=datetime.timezone.utc)
+
+    try:
+        with open(file_path, "rb") as data:
+            result = blob_client.upload_blob(data, overwrite=True, length=local_stat.st_size,
+                                             max_concurrency=UPLOAD_MAX_CONCURRENCY, validate_content=False, **upload_options)
+    except ResourceModifiedError:
+        print(f"Skipping upload for {file_path} since blob is up-to-date.")
+        return
+    except Exception as e:
+        print(f"\tError uploading {file_path}: {e}")
+        return
+    blob_index[blob_name] = result["last_modified"].timestamp()
+    print(f"\tUploaded {file_path} to container '{container_name}'.")
+
+def _preallocate(fd, size):
+    """
+    Reserva size bytes para el fichero (posix_fallocate) para que el sistema de ficheros
+    asigne bloques contiguos a los ficheros grandes. Si no está disponible no hace nada.
+    """
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError:
+            pass
+
+def _update_hashes(hashes, data):
+    """
+    Actualiza los resúmenes (hashlib) con un bloque de datos. hashlib libera el GIL
+    con bloques grandes, así que puede ejecutarse en un hilo en paralelo con la escritura.
+    """
+    for h in hashes:
+        h.update(data)
+
+async def download_file(ctx, file_url, file_ext):
+    """
+    Descarga el fichero desde file_url hacia ctx.download_dir usando la sesión aiohttp compartida.
     Si se trata de una página HTML se extrae la última parte de la URL y se le asigna la extensión ".html".
     Por ejemplo, si la URL es "https://www.website.com/page1/", se guardará como "page1.html".
-    Posteriormente, opcionalmente se sube el archivo a Azure Blob Storage.
+    El contenido se escribe primero en un fichero ".part" que se renombra al terminar,
+    de modo que nunca quedan ficheros a medio escribir con el nombre definitivo.
+    Posteriormente, si hay ctx.upload_executor, el archivo se sube a Azure Blob Storage
+    en segundo plano (el futuro queda en ctx.upload_futures mientras no termine).
     """
-    global downloaded_files_count
+    if ctx.max_files_reached():
+        return
 
-    parsed = urllib.parse.urlparse(file_url)  
-    if file_url in exclude_download:  
+    parsed = _splitcache(file_url)
+    if file_url in ctx.exclude_download:
         print(f"Skipping download (URL excluded): {file_url}")  
         return  
+    if not await robots_allowed(ctx, file_url):
+        print(f"Skipping download (disallowed by robots.txt): {file_url}")
+        return
 
     # Para la asignación del nombre del archivo:  
     filename = os.path.basename(parsed.path)  
@@ -98,134 +491,404 @@ def download_file(file_url, file_ext, download_dir, delay, exclude_download, blo
                 filename += ".html"  
     else:  
         if not filename:  
-            filename = "downloaded_file_" + str(int(time.time())) + "." + file_ext  
+            # El contador evita colisiones entre descargas simultáneas en el mismo segundo.
+            filename = f"downloaded_file_{int(time.time())}_{next(ctx.unnamed_files)}.{file_ext}"
 
-    local_path = os.path.join(download_dir, filename)  
-    
-    if os.path.exists(local_path):  
-        print(f"\tFile {local_path} already exists, skipping it")  
-        return  
+    local_path = os.path.join(ctx.download_dir, filename)
 
-    try:  
-        response = requests.get(file_url, stream=True, timeout=15)  
-        response.raise_for_status()  
-        with open(local_path, 'wb') as f:  
-            for chunk in response.iter_content(chunk_size=8192):  
-                if chunk:  
-                    f.write(chunk)  
-        print(f"\tDownloaded: {file_url} -> {local_path}")  
-        downloaded_files_count += 1  
-    except Exception as e:  
-        print(f"\tError downloading {file_url}: {e}")  
-        return  
+    if os.path.exists(local_path) or local_path in ctx.downloads_in_progress:
+        print(f"\tFile {local_path} already exists, skipping it")
+        return
 
-    # Subida opcional a Azure Blob Storage  
-    if blob_upload and blob_service_client:  
-        upload_to_azure_blob(local_path, container_name, blob_service_client)  
+    tmp_path = local_path + ".part"
+    ctx.downloads_in_progress.add(local_path)
+    try:
+        digest = hashlib.sha256()
+        md5 = hashlib.md5()
+        # Los límites por host se indexan con el host normalizado (ver link_info()).
+        host = link_info(file_url)[0]
+        async with ctx.host_sems[host]:
+            await wait_for_host(ctx, host)
+            async with await get_with_retries(ctx.session, file_url) as response:
+                response.raise_for_status()
+                async with aiofiles.open(tmp_path, "wb") as f:
+                    # Si se conoce el tamaño (y el cuerpo no viene comprimido, en cuyo caso
+                    # Content-Length no es el tamaño final) se reserva el espacio de antemano.
+                    preallocated = bool(response.content_length) and "Content-Encoding" not in response.headers
+                    if preallocated:
+                        await asyncio.to_thread(_preallocate, f.fileno(), response.content_length)
+                    # Cada escritura con aiofiles pasa por un hilo: se agrupan los
+                    # fragmentos recibidos para escribir en bloques grandes. Los hashes
+                    # de cada bloque se calculan en otro hilo a la vez que se escribe,
+                    # sin ocupar el event loop que atiende al resto de descargas.
+                    buffer = bytearray()
+                    async for chunk in response.content.iter_any():
+                        buffer += chunk
+                        if len(buffer) >= ctx.io_chunksize:
+                            await asyncio.gather(f.write(buffer),
+                                                 asyncio.to_thread(_update_hashes, (digest, md5), buffer))
+                            buffer.clear()
+                    if buffer:
+                        await asyncio.gather(f.write(buffer),
+                                             asyncio.to_thread(_update_hashes, (digest, md5), buffer))
+                    # Si llegó menos de lo anunciado se descarta el espacio reservado sobrante.
+                    if preallocated:
+                        await f.truncate()
+                    # Fecha y tamaño definitivos del fichero (os.replace los conserva),
+                    # para la subida a Azure sin otra consulta al sistema de ficheros.
+                    await f.flush()
+                    local_stat = os.fstat(f.fileno())
+        # Mientras se descargaba pudo alcanzarse el máximo de ficheros.
+        if ctx.max_files_reached():
+            os.remove(tmp_path)
+            return
+        # Si ya se descargó un fichero con el mismo contenido no se guarda ni se sube.
+        duplicate_of = register_digest(ctx, digest.hexdigest(), local_path)
+        if duplicate_of is not None:
+            os.remove(tmp_path)
+            print(f"\tSkipping {file_url}: same content as {duplicate_of}")
+            return
+        os.replace(tmp_path, local_path)
+        print(f"\tDownloaded: {file_url} -> {local_path}")
+        ctx.downloaded_files_count += 1
+    except Exception as e:
+        print(f"\tError downloading {file_url}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    finally:
+        ctx.downloads_in_progress.discard(local_path)
 
-    time.sleep(delay)  
- 
-def crawl(driver, url, start_domain, current_depth, max_depth, stay_on_domain,
-allowed_exts, max_files, delay, exclude_download, exclude_crawl,
-blob_upload, container_name, blob_service_client):
+    # Subida opcional a Azure Blob Storage
+    if ctx.upload_executor is not None:
+        upload = functools.partial(upload_to_azure_blob, local_path, ctx.container_name, ctx.blob_service_client,
+                                   ctx.blob_index, md5=md5.digest(), local_stat=local_stat)
+        future = asyncio.get_running_loop().run_in_executor(ctx.upload_executor, upload)
+        ctx.upload_futures.add(future)
+        future.add_done_callback(ctx.upload_futures.discard)
+
+async def robots_allowed(ctx, url):
+    """
+    Indica si el robots.txt del host permite rastrear la URL (siempre True si
+    ctx.obey_robots es False). El robots.txt de cada host se descarga una sola vez;
+    si indica un Crawl-delay mayor que ctx.delay, se usa para ese host en wait_for_host().
+    Siguiendo el criterio de urllib.robotparser, un 401/403 prohíbe todo el host y
+    cualquier otro error (o un robots.txt inexistente) lo permite todo.
+    Una URL que urllib.robotparser no puede analizar se considera no permitida.
+    """
+    if not ctx.obey_robots:
+        return True
+    parts = _splitcache(url)
+    host = link_info(url)[0]
+    parser = ctx.robots.get(host)
+    if parser is None:
+        async with ctx.robots_locks[host]:
+            parser = ctx.robots.get(host)
+            if parser is None:
+                parser = urllib.robotparser.RobotFileParser()
+                try:
+                    async with ctx.session.get(f"{parts.scheme}://{host}/robots.txt",
+                                               timeout=aiohttp.ClientTimeout(total=ROBOTS_TIMEOUT)) as response:
+                        if response.status in (401, 403):
+                            parser.disallow_all = True
+                        elif response.status >= 400:
+                            parser.allow_all = True
+                        else:
+                            parser.parse((await response.text(errors="replace")).splitlines())
+                except Exception:
+                    parser.allow_all = True
+                crawl_delay = parser.crawl_delay(ROBOTS_AGENT)
+                if crawl_delay and float(crawl_delay) > ctx.delay:
+                    ctx.host_delays[host] = float(crawl_delay)
+                ctx.robots[host] = parser
+    try:
+        return parser.can_fetch(ROBOTS_AGENT, url)
+    except ValueError:
+        return False
+
+async def wait_for_host(ctx, host):
+    """
+    Limitador de ritmo por host: espera lo necesario para que entre dos peticiones
+    al mismo host pasen al menos ctx.delay segundos (o el Crawl-delay de su robots.txt,
+    si es mayor). Las peticiones a otros hosts no esperan, a diferencia de un
+    time.sleep(delay) tras cada petición.
+    Sin espera que aplicar no se toma el cerrojo del host.
+    """
+    delay = ctx.host_delays.get(host, ctx.delay)
+    if delay <= 0:
+        return
+    async with ctx.host_locks[host]:
+        wait = delay - (time.monotonic() - ctx.host_last_request[host])
+        if wait > 0:
+            await asyncio.sleep(wait)
+        ctx.host_last_request[host] = time.monotonic()
+
+async def get_with_retries(session, url):
+    """
+    Hace un GET con la sesión compartida reintentando (con espera exponencial) los
+    errores de conexión y las respuestas 429/5xx. Si el servidor envía Retry-After
+    en segundos se respeta. Devuelve la respuesta, que el llamador debe cerrar
+    (por ejemplo, usándola con "async with").
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        wait = RETRY_BACKOFF * 2 ** attempt
+        try:
+            response = await session.get(url)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == MAX_RETRIES:
+                raise
+        else:
+            if response.status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                return response
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                wait = int(retry_after)
+            response.release()
+        await asyncio.sleep(wait)
+
+async def fetch_html(session, url):
+    """
+    Descarga el HTML de la URL indicada usando la sesión aiohttp compartida.
+    La sesión mantiene las conexiones abiertas (keep-alive), por lo que las
+    peticiones sucesivas al mismo host reutilizan la conexión TCP/TLS.
+    Devuelve (html, url_final): la URL final (tras redirecciones) es la base para
+    resolver los enlaces relativos. Si la respuesta no es HTML no se lee el cuerpo
+    y se devuelve una cadena vacía.
     """
-    Recorre (crawl) recursivamente la página en la URL dada usando Selenium.
+    async with await get_with_retries(session, url) as response:
+        response.raise_for_status()
+        if response.content_type not in ("text/html", "application/xhtml+xml"):
+            return "", str(response.url)
+        return await response.text(errors="replace"), str(response.url)
+
+def extract_links(html, base_url):
+    """
+    Extrae los enlaces ("a") de un documento HTML y los resuelve respecto a base_url.
+    Solo se devuelven enlaces absolutos http/https.
+    """
+    links = set()
+    for node in HTMLParser(html).css("a[href]"):
+        href = node.attributes.get("href")
+        if not href or _SKIP_HREF_RE.match(href):
+            continue
+        try:
+            link = urllib.parse.urljoin(base_url, href.strip())
+        except ValueError:
+            # href mal formado (por ejemplo, "http://[x"): se ignora.
+            continue
+        if link.startswith("http"):
+            links.add(link)
+    return links
+
+def extract_links_selenium(driver_pool, url, delay):
+    """
+    Carga la página con Selenium (ejecutando JavaScript) y extrae los enlaces ("a").
+    Toma un driver libre del pool (esperando si todos están ocupados) y lo devuelve
+    al terminar, tras borrar las cookies para no arrastrar la sesión a otra página.
+    """
+    from selenium.common.exceptions import WebDriverException
+
+    driver = driver_pool.get()
+    try:
+        driver.get(url)
+
+        # Dar tiempo para que se renderice la página
+        time.sleep(delay)
+
+        # Extraer todos los enlaces de la página con una única llamada al navegador
+        # (en lugar de una petición a WebDriver por cada elemento "a"). Los repetidos
+        # se eliminan en el navegador para no enviarlos de vuelta por WebDriver.
+        hrefs = driver.execute_script(
+            "return Array.from(new Set(Array.from(document.querySelectorAll('a[href]'), a => a.href)))")
+    finally:
+        try:
+            driver.delete_all_cookies()
+        except WebDriverException:
+            pass
+        driver_pool.put(driver)
+    return {href for href in hrefs or [] if href and href.startswith("http")}
+
+async def crawl(ctx, url, current_depth):
+    """
+    Procesa (crawl) la página en la URL dada y encola los enlaces que deban recorrerse.
+    Si ctx.driver_pool es None la página se descarga con aiohttp y se parsea con selectolax;
+    en caso contrario se usa Selenium (necesario cuando se ejecuta JavaScript).
     Extrae los enlaces (“a”) y, dependiendo de la extensión:
     • Si la URL no tiene extensión se asume HTML.
-    • Si la URL es una página HTML (extensión "html") se descarga (si se ha solicitado)
-    y se recorre el contenido para extraer más enlaces (si se cumple la profundidad).
-    • Si la URL tiene una extensión en allowed_exts (como PDF, etc.) se descarga.
-    • En caso de que la extensión no esté en allowed_exts se asume que es una página
-    (por ejemplo, “.php”) y se recorre.
+    • Si la URL es una página HTML (extensión "html") se encola para su descarga (si se ha solicitado)
+    y se encola para extraer más enlaces (si se cumple la profundidad).
+    • Si la URL tiene una extensión en ctx.allowed_exts (como PDF, etc.) se encola para su descarga.
+    • En caso de que la extensión no esté en ctx.allowed_exts se asume que es una página
+    (por ejemplo, “.php”) y se encola.
     La profundidad se cuenta como el número de “saltos” entre enlaces (nivel 1: URL inicial, 2: enlace, etc.).
     """
-    global visited_pages, downloaded_files_count
+    if ctx.max_files_reached():
+        return
 
-    if max_files and downloaded_files_count >= max_files:  
-        return  
+    if not mark_visited(ctx, canonicalize(url)):
+        return
 
-    if url in visited_pages:  
-        return  
-    visited_pages.add(url)  
-    
-    # Si la URL se encuentra en la lista de exclusión para el crawling se omite.  
-    for ex in exclude_crawl:  
-        if ex in url:  
-            print(f"Skipping crawl (URL excluded): {url}")  
-            return  
+    # Si la URL se encuentra en la lista de exclusión para el crawling se omite.
+    if ctx.exclude_crawl_re and ctx.exclude_crawl_re.search(url):
+        print(f"Skipping crawl (URL excluded): {url}")
+        return
+    if not await robots_allowed(ctx, url):
+        print(f"Skipping crawl (disallowed by robots.txt): {url}")
+        return
 
-    print(f"Crawling (depth {current_depth}): {url}")  
-    try:  
-        driver.get(url)  
-    except Exception as e:  
-        print(f"Error loading {url}: {e}")  
-        return  
+    print(f"Crawling (depth {current_depth}): {url}")
+    try:
+        # Cortesía por host: como mucho per_host peticiones simultáneas contra el mismo
+        # servidor, separadas al menos delay segundos entre sí.
+        host = link_info(url)[0]
+        async with ctx.host_sems[host]:
+            await wait_for_host(ctx, host)
+            if ctx.driver_pool is not None:
+                # Selenium es bloqueante: se ejecuta en un hilo (uno por driver) para no parar el event loop.
+                links = await asyncio.get_running_loop().run_in_executor(
+                    ctx.driver_executor, extract_links_selenium, ctx.driver_pool, url, ctx.delay)
+            else:
+                html, base_url = await fetch_html(ctx.session, url)
+                links = extract_links(html, base_url) if html else set()
+    except Exception as e:
+        print(f"Error loading {url}: {e}")
+        return
 
-    # Dar tiempo para que se renderice la página (en caso de requerir JS)  
-    time.sleep(delay)  
-    
-    # Extraer todos los enlaces de la página  
-    try:  
-        elems = driver.find_elements(By.TAG_NAME, "a")  
-    except NoSuchElementException:  
-        elems = []  
-    
-    # Prepare the list of found links
-    links = set()  
-    for elem in elems:  
-        try:  
-            href = elem.get_attribute("href")  
-        except StaleElementReferenceException:  
-            continue  # Si el elemento es stale, se omite  
-        if href and href.startswith("http"):  
-            links.add(href)  
-    
-    # Remove visited pages from links found
-    links.difference_update(visited_pages)
+    # Remove visited pages from links found, keeping a single link per canonical URL
+    unique_links = {}
+    for link in links:
+        try:
+            canonical = canonicalize(link)
+        except ValueError:
+            # Un enlace que no se puede analizar no debe impedir procesar los demás.
+            continue
+        if canonical not in ctx.visited_pages:
+            unique_links.setdefault(canonical, link)
+    links = set(unique_links.values())
     print(f"\tfound links after removing visited: {links}")
 
-    # Procesamos cadta enlace encontrado  
-    for link in links:  
-        parsed_link = urllib.parse.urlparse(link)  
-        # Extrae la extensión: si no hay (cadena vacía) se asume HTML  
-        file_ext = os.path.splitext(parsed_link.path)[1].strip(".").lower()  
-        if file_ext == "":  
-            file_ext = "html"  
-
-        # Tratamiento especial para páginas HTML  
-        if file_ext == "html":  
-            # Si se restringe a un dominio, verificar que el enlace pertenezca al mismo.  
-            if stay_on_domain and urllib.parse.urlparse(link).netloc != start_domain:  
-                continue  
-            # Si se indicó que se descarguen páginas HTML (por ejemplo, al incluir "html" en --extensions)  
-            if "html" in allowed_exts and (max_files == 0 or downloaded_files_count < max_files):  
-                download_file(link, "html", download_dir, delay, exclude_download, blob_upload, container_name, blob_service_client)  
-            # Si se supera la profundidad máxima, no se continúa.  
-            if max_depth != 0 and current_depth >= max_depth:  
-                continue  
-            # Recorrida recursiva en la página HTML  
-            crawl(driver, link, start_domain, current_depth + 1, max_depth, stay_on_domain,  
-                allowed_exts, max_files, delay, exclude_download, exclude_crawl, blob_upload, container_name, blob_service_client)  
-            if max_files and downloaded_files_count >= max_files:  
-                break  
-
-        # Si la extensión está en la lista de archivos a descargar (por ejemplo, pdf) y NO es html.  
-        elif file_ext in allowed_exts:  
-            if max_files and downloaded_files_count >= max_files:  
-                break  
-            download_file(link, file_ext, download_dir, delay, exclude_download, blob_upload, container_name, blob_service_client)  
-
-        # En caso de que la extensión no esté en allowed_exts se asume que podría tratarse de una página (por ejemplo, .php)  
-        else:  
-            if stay_on_domain and urllib.parse.urlparse(link).netloc != start_domain:  
-                continue  
-            if max_depth != 0 and current_depth >= max_depth:  
-                continue  
-            crawl(driver, link, start_domain, current_depth + 1, max_depth, stay_on_domain,  
-                allowed_exts, max_files, delay, exclude_download, exclude_crawl, blob_upload, container_name, blob_service_client)  
-            if max_files and downloaded_files_count >= max_files:  
-                break  
- 
+    # Procesamos cada enlace encontrado
+    for link in links:
+        if ctx.max_files_reached():
+            break
+
+        netloc, file_ext = link_info(link)
+        # Si se restringe a un dominio, las páginas de otros hosts no se recorren.
+        skip_page = ctx.stay_on_domain and netloc != ctx.start_domain
+
+        # Tratamiento especial para páginas HTML
+        if file_ext == "html":
+            if skip_page:
+                continue
+            # Si se indicó que se descarguen páginas HTML (por ejemplo, al incluir "html" en --extensions)
+            if "html" in ctx.allowed_exts:
+                enqueue_download(ctx, link, "html")
+            # Si se supera la profundidad máxima, no se continúa.
+            if ctx.max_depth != 0 and current_depth >= ctx.max_depth:
+                continue
+            enqueue_page(ctx, link, current_depth + 1)
+
+        # Si la extensión está en la lista de archivos a descargar (por ejemplo, pdf) y NO es html.
+        elif file_ext in ctx.allowed_exts:
+            enqueue_download(ctx, link, file_ext)
+
+        # En caso de que la extensión no esté en allowed_exts se asume que podría tratarse de una página (por ejemplo, .php)
+        else:
+            if skip_page:
+                continue
+            if ctx.max_depth != 0 and current_depth >= ctx.max_depth:
+                continue
+            enqueue_page(ctx, link, current_depth + 1)
+
+async def worker(ctx):
+    """
+    Tarea del pool: extrae la siguiente página de la frontera y la procesa con crawl().
+    La página deja de estar pendiente (ver dequeue_page()) solo cuando crawl() termina,
+    es decir, con sus enlaces ya encolados; si el rastreo se interrumpe antes, o se
+    detiene al alcanzar max_files, sigue pendiente para la próxima ejecución.
+    """
+    while True:
+        _, depth, _, url = await ctx.queue.get()
+        try:
+            await crawl(ctx, url, depth)
+            if not ctx.max_files_reached():
+                dequeue_page(ctx, url)
+        except Exception as e:
+            print(f"Error crawling {url}: {e}")
+        finally:
+            ctx.queue.task_done()
+
+async def download_worker(ctx):
+    """
+    Tarea del pool de descargas: extrae (url, extensión) de la cola y descarga el fichero.
+    Como con las páginas, la descarga sigue pendiente si se interrumpe o se alcanza max_files.
+    """
+    while True:
+        file_url, file_ext = await ctx.download_queue.get()
+        try:
+            await download_file(ctx, file_url, file_ext)
+            if not ctx.max_files_reached():
+                dequeue_download(ctx, file_url)
+        except Exception as e:
+            print(f"Error downloading {file_url}: {e}")
+        finally:
+            ctx.download_queue.task_done()
+
+async def crawl_async(ctx, url, concurrency, download_workers, blob_upload):
+    """
+    Punto de entrada asíncrono: abre una única sesión aiohttp (con pool de
+    conexiones y caché DNS) y recorre el sitio en anchura (BFS) con un pool de
+    `concurrency` workers que consumen la frontera de páginas (ver _put_page()).
+    Los ficheros encontrados se envían a una segunda cola atendida por
+    `download_workers` tareas de descarga, y las subidas a Azure Blob Storage
+    se reparten en un pool de hilos.
+    El rastreo termina cuando ambas colas quedan vacías y han acabado las subidas.
+    """
+    ctx.queue = asyncio.PriorityQueue()
+    ctx.download_queue = asyncio.Queue()
+    # Si se reanuda un rastreo anterior se parte de sus páginas y descargas pendientes.
+    pending = pending_pages(ctx)
+    downloads = pending_downloads(ctx)
+    if pending or downloads:
+        print(f"Resuming crawl with {len(pending)} pending pages and {len(downloads)} pending downloads")
+        for pending_url, depth in pending:
+            _put_page(ctx, pending_url, depth)
+        for file_url, file_ext in downloads:
+            enqueue_download(ctx, file_url, file_ext)
+    else:
+        enqueue_page(ctx, url, 1)
+    if ctx.driver_pool is not None:
+        ctx.driver_executor = concurrent.futures.ThreadPoolExecutor(max_workers=ctx.driver_pool.qsize())
+    if blob_upload and ctx.blob_service_client:
+        ctx.upload_executor = concurrent.futures.ThreadPoolExecutor(max_workers=UPLOAD_WORKERS)
+
+    # El conector limita también las conexiones abiertas contra cada host, en línea con --per_host.
+    # Las conexiones ociosas se mantienen vivas más allá de --delay para que la espera entre
+    # peticiones al mismo host no obligue a repetir el handshake TCP/TLS.
+    connector = aiohttp.TCPConnector(limit=CONNECTION_LIMIT, limit_per_host=ctx.per_host,
+                                     keepalive_timeout=max(KEEPALIVE_TIMEOUT, 2 * ctx.delay),
+                                     ttl_dns_cache=300)
+    # Sin límite total (los ficheros grandes pueden tardar), pero sí al conectar y entre lecturas.
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=15, sock_read=15)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                     headers={"User-Agent": USER_AGENT}) as session:
+        ctx.session = session
+        workers = [asyncio.create_task(worker(ctx)) for _ in range(concurrency)]
+        workers += [asyncio.create_task(download_worker(ctx)) for _ in range(download_workers)]
+        await ctx.queue.join()
+        await ctx.download_queue.join()
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    if ctx.driver_executor is not None:
+        ctx.driver_executor.shutdown()
+    if ctx.upload_executor is not None:
+        if ctx.upload_futures:
+            print(f"Waiting for {len(ctx.upload_futures)} pending uploads")
+        await asyncio.gather(*ctx.upload_futures)
+        ctx.upload_executor.shutdown()
+
 def main():
     parser = argparse.ArgumentParser(description="Website crawler and file downloader")
 
@@ -238,6 +901,8 @@ def main():
                         help="Profundidad máxima de navegación (0 para infinita). Por defecto: 2")  
     parser.add_argument("--js", choices=["yes", "no"], default="no",  
                         help="Ejecutar JavaScript en las páginas (usando Selenium headless; puede afectar los tiempos de espera). Por defecto: no")  
+    parser.add_argument("--js_drivers", type=int, default=4,
+                        help="Número de navegadores headless que se usan en paralelo cuando --js yes. Por defecto: 4")
     parser.add_argument("--stay_on_domain", choices=["yes", "no"], default="yes",  
                         help="Restringir el rastreo al mismo dominio que la URL de partida. Por defecto: yes")  
     parser.add_argument("--max_files", type=int, default=100,  
@@ -245,28 +910,40 @@ def main():
     parser.add_argument("--extensions", nargs="+", default=["pdf", "html"],  
                         help="Extensiones de archivo a descargar (sin el punto). Por defecto: pdf html")  
     parser.add_argument("--delay", type=float, default=1,  
-                        help="Segundos a esperar entre solicitudes. Por defecto: 1")  
+                        help="Segundos a esperar entre solicitudes al mismo host. Por defecto: 1")  
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Número de páginas que se procesan en paralelo. Por defecto: 8")
+    parser.add_argument("--per_host", type=int, default=2,
+                        help="Máximo de peticiones simultáneas contra un mismo host. Por defecto: 2")
+    parser.add_argument("--download_workers", type=int, default=8,
+                        help="Número de descargas de ficheros simultáneas. Por defecto: 8")
+    parser.add_argument("--io_chunksize", type=parse_size, default=DOWNLOAD_CHUNK_SIZE,
+                        help="Tamaño de los bloques escritos a disco al descargar (admite sufijos k y M, por ejemplo 256k). "
+                             "Bloques más grandes reducen la sobrecarga por escritura. Por defecto: 1M")
+    parser.add_argument("--robots", choices=["yes", "no"], default="yes",
+                        help="Respetar el robots.txt de cada host (Disallow y Crawl-delay, si es mayor que --delay). Por defecto: yes")
     parser.add_argument("--exclude_download", nargs="*", default=[],  
                         help="Lista de subcadenas de URL a excluir de la descarga")  
     parser.add_argument("--exclude_crawl", nargs="*", default=[],  
                         help="Lista de subcadenas de URL a excluir del rastreo")  
+    parser.add_argument("--state_db",
+                        help="Fichero SQLite donde guardar las URLs visitadas y la cola pendiente para poder reanudar el rastreo")
     parser.add_argument("--upload_blob", choices=["yes", "no"], default="no",  
                         help="Subir archivos a Azure Blob Storage. Por defecto: no")  
     parser.add_argument("--container", help="Nombre del contenedor de Azure Blob Storage (requerido si --upload_blob yes)")  
 
     args = parser.parse_args()  
 
-    global download_dir  # para usarlo en crawl() y download_file()  
-    download_dir = args.download_dir  
+    download_dir = args.download_dir
 
     # Crear el directorio de descarga si no existe.  
-    if not os.path.exists(download_dir):  
-        os.makedirs(download_dir)  
+    os.makedirs(download_dir, exist_ok=True)
 
     # Configurar Azure Blob Storage si es necesario.  
     blob_upload = args.upload_blob.lower() == "yes"  
     container_name = None  
     blob_service_client = None  
+    blob_index = {}
     if blob_upload:  
         if not args.container:  
             print("Error: Especifique --container <container_name> cuando --upload_blob sea yes.")  
@@ -281,40 +958,65 @@ def main():
             print("Error: AZURE_BLOB_CONNECTION_STRING no se encontró en el archivo .env.")  
             sys.exit(1)  
         try:  
-            blob_service_client = BlobServiceClient.from_connection_string(conn_str)  
+            blob_service_client = BlobServiceClient.from_connection_string(conn_str, max_block_size=UPLOAD_BLOCK_SIZE)
             try:  
                 blob_service_client.create_container(container_name)  
                 print(f"Created container: {container_name}")  
             except Exception:  
                 pass  
+            # Fechas de todos los blobs existentes, para no consultarlas una a una al subir.
+            # Si las credenciales no permiten listar (por ejemplo, una SAS sin permiso "l")
+            # se sigue con el índice vacío: los ficheros se suben sobrescribiendo los blobs.
+            try:
+                blob_index = list_blob_index(container_name, blob_service_client)
+            except Exception as e:
+                print("Aviso: no se pudo listar el contenedor; se subirán todos los archivos:", e)
         except Exception as e:  
             print("Error configurando Azure Blob Storage:", e)  
             sys.exit(1)  
 
-    # Configurar Selenium WebDriver  
-    driver = setup_driver(args.js.lower() == "yes")  
-    start_domain = urllib.parse.urlparse(args.starting_url).netloc  
+    # Configurar el pool de Selenium WebDriver (solo es necesario si se ejecuta JavaScript)
+    drivers = []
+    driver_pool = None
+    if args.js.lower() == "yes":
+        drivers = [setup_driver(True) for _ in range(max(1, args.js_drivers))]
+        driver_pool = Queue()
+        for driver in drivers:
+            driver_pool.put(driver)
 
-    try:  
-        crawl(driver=driver,  
-            url=args.starting_url,  
-            start_domain=start_domain,  
-            current_depth=1,  
-            max_depth=args.max_depth,  
-            stay_on_domain=args.stay_on_domain.lower() == "yes",  
-            allowed_exts=[ext.lower() for ext in args.extensions],  
-            max_files=args.max_files,  
-            delay=args.delay,  
-            exclude_download=args.exclude_download,  
-            exclude_crawl=args.exclude_crawl,  
-            blob_upload=blob_upload,  
-            container_name=container_name,  
-            blob_service_client=blob_service_client)  
-    
-    finally:  
-        driver.quit()  
-    
-    print(f"Finished crawling. Total files downloaded: {downloaded_files_count}")  
+    ctx = CrawlContext(download_dir=download_dir,
+        start_domain=urllib.parse.urlparse(args.starting_url).netloc.lower(),
+        max_depth=args.max_depth,
+        stay_on_domain=args.stay_on_domain.lower() == "yes",
+        allowed_exts=frozenset(ext.lower() for ext in args.extensions),
+        max_files=args.max_files,
+        delay=args.delay,
+        exclude_download=frozenset(args.exclude_download),
+        exclude_crawl_re=re.compile("|".join(map(re.escape, args.exclude_crawl))) if args.exclude_crawl else None,
+        per_host=args.per_host,
+        io_chunksize=args.io_chunksize,
+        obey_robots=args.robots.lower() == "yes",
+        driver_pool=driver_pool,
+        container_name=container_name,
+        blob_service_client=blob_service_client,
+        blob_index=blob_index)
+
+    if args.state_db:
+        open_state_db(ctx, args.state_db)
+
+    try:
+        asyncio.run(crawl_async(ctx,
+            args.starting_url,
+            concurrency=args.concurrency,
+            download_workers=args.download_workers,
+            blob_upload=blob_upload))
+
+    finally:
+        for driver in drivers:
+            driver.quit()
+        close_state_db(ctx)
+
+    print(f"Finished crawling. Total files downloaded: {ctx.downloaded_files_count}")  
  
 if __name__ == "__main__":
     main()
\ No newline at end of file